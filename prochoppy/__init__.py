@@ -1,13 +1,42 @@
 """Package init file for ProChopPy."""
-from copy import copy
-from wave import open as wave_open, Wave_read, Wave_write
+from array import array
+from mmap import mmap, ACCESS_READ
+import os
+from struct import Struct
+from wave import Error as WaveError
 from pathlib import Path
-from typing import NamedTuple
+from typing import Iterator, NamedTuple
 
 __all__ = ["AnnotationReader", "WaveInfo", "WaveReader", "WaveWriter"]
 
 StrPath = str | Path
 
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+# The SubFormat GUID (in its little-endian byte layout) of extensible integer PCM
+KSDATAFORMAT_SUBTYPE_PCM = b"\x01\x00\x00\x00\x00\x00\x10\x00\x80\x00\x00\xaa\x00\x38\x9b\x71"
+
+_RIFF_HEADER = Struct("<4sI4s")
+_CHUNK_HEADER = Struct("<4sI")
+_FMT_CHUNK = Struct("<HHIIHH")
+_FMT_EXTENSION = Struct("<HHI16s")
+_WAVE_HEADER = Struct("<4sI4s4sIHHIIHH4sI")
+
+# Only available on some platforms
+_O_BINARY: int = getattr(os, "O_BINARY", 0)
+_writev = getattr(os, "writev", None)
+try:
+    _IOV_MAX: int = os.sysconf("SC_IOV_MAX")
+except (AttributeError, ValueError, OSError):
+    _IOV_MAX = -1
+if _IOV_MAX <= 0:
+    # No definite limit reported, so stay within the POSIX minimum
+    _IOV_MAX = 16
+try:
+    from mmap import MADV_SEQUENTIAL
+except ImportError:
+    MADV_SEQUENTIAL = None
+
 
 class WaveInfo(NamedTuple):
     """Class to represent information about a wave audio object.
@@ -39,13 +68,15 @@ class AnnotationReader:
     """Class for reading ProRec annotation files."""
 
     _filename: Path
-    _markers: list[tuple[float, str]]
-    _sections: list[tuple[float, float, str]]
+    _times: array  # array[float]
+    _ends: array  # array[float]
+    _labels: list[str]
     _max_marker_len: int
 
     def __init__(self, filename: StrPath):
-        self._markers = []
-        self._sections = []
+        self._times = array("d")
+        self._ends = array("d")
+        self._labels = []
         self._max_marker_len = 0
         self._filename = Path(filename)
         if not self._filename.exists():
@@ -55,24 +86,25 @@ class AnnotationReader:
 
     def _read(self):
         with self._filename.open("r") as fp:
-            for line in fp:
-                if "\t" not in line:
-                    raise IOError("File appears not to be a valid ProRec annotation file.")
-                time, label = line.split("\t", maxsplit=2)
-                self._markers.append((float(time), label.strip()))
-                self._max_marker_len = max(self._max_marker_len, len(label.strip()))
-    
+            # Text mode already normalises line endings, and unlike splitlines() this
+            # leaves other separator characters (e.g. form feeds) inside labels
+            lines = fp.read().split("\n")
+        if not lines[-1]:
+            lines.pop()
+        fields = [line.partition("\t") for line in lines]
+        if not all(sep for _, sep, _ in fields):
+            raise IOError("File appears not to be a valid ProRec annotation file.")
+        self._times = array("d", map(float, [time for time, _, _ in fields]))
+        self._labels = [label.strip() for _, _, label in fields]
+        self._max_marker_len = max(map(len, self._labels), default=0)
+
     def _compute_sections(self):
-        max = len(self._markers)
-        for i in range(max):
-            start_time, label = self._markers[i]
-            if i + 1 < max:
-                end_time = self._markers[i + 1][0]
-                self._sections.append((start_time, end_time, label))
-
-    def get_markers(self) -> dict[float, str]:
+        # Each section ends where the next one starts, the last marker only ends a section
+        self._ends = self._times[1:]
+
+    def get_markers(self) -> list[tuple[float, str]]:
         """Get a copy of the Annotation markers."""
-        return copy(self._markers)  # type: ignore
+        return list(zip(self._times, self._labels))
 
     def get_max_marker_len(self) -> int:
         """Get the maximal length of a marker label."""
@@ -82,85 +114,166 @@ class AnnotationReader:
         """Get the filename of the annotation file."""
         return self._filename
 
-    def __iter__(self):
-        return copy(self._sections).__iter__()
+    def __iter__(self) -> Iterator[tuple[float, float, str]]:
+        return zip(self._times, self._ends, self._labels)
 
     def __len__(self):
-        return len(self._sections)
+        return len(self._ends)
 
 
 class WaveReader:
     """Class for reading wave files."""
 
     _filename: Path
-    _fp: Wave_read
+    _mm: mmap
+    _view: memoryview
     _info: WaveInfo
+    _sample_rate: int
+    _frame_bytes: int
 
     def __init__(self, filename: StrPath):
         self._filename = Path(filename)
-        self._fp: Wave_read = wave_open(str(filename), mode="rb")
+        with open(filename, "rb") as fp:
+            if not os.fstat(fp.fileno()).st_size:
+                raise WaveError("file does not start with RIFF id")
+            self._mm = mmap(fp.fileno(), 0, access=ACCESS_READ)
+        if MADV_SEQUENTIAL is not None:
+            # Sections are read in file order, so let the kernel read ahead aggressively
+            # rather than faulting in the mapping a few pages at a time
+            self._mm.madvise(MADV_SEQUENTIAL)
+        self._view = memoryview(self._mm)
+        self._read_header()
+
+    def _read_header(self):
+        if len(self._mm) < _RIFF_HEADER.size:
+            raise WaveError("file does not start with RIFF id")
+        riff_id, _, wave_id = _RIFF_HEADER.unpack_from(self._mm)
+        if riff_id != b"RIFF":
+            raise WaveError("file does not start with RIFF id")
+        if wave_id != b"WAVE":
+            raise WaveError("not a WAVE file")
+        fmt: tuple[int, ...] | None = None
+        offset = _RIFF_HEADER.size
+        while offset + _CHUNK_HEADER.size <= len(self._mm):
+            chunk_id, chunk_size = _CHUNK_HEADER.unpack_from(self._mm, offset)
+            offset += _CHUNK_HEADER.size
+            if chunk_id == b"fmt ":
+                if chunk_size < _FMT_CHUNK.size or offset + _FMT_CHUNK.size > len(self._mm):
+                    raise WaveError("fmt chunk is truncated")
+                fmt = _FMT_CHUNK.unpack_from(self._mm, offset)
+                if fmt[0] == WAVE_FORMAT_EXTENSIBLE:
+                    extension_end = offset + _FMT_CHUNK.size + _FMT_EXTENSION.size
+                    if (chunk_size < _FMT_CHUNK.size + _FMT_EXTENSION.size
+                            or extension_end > len(self._mm)):
+                        raise WaveError("fmt chunk is truncated")
+                    _, _, _, sub_format = _FMT_EXTENSION.unpack_from(
+                        self._mm, offset + _FMT_CHUNK.size
+                    )
+                    if sub_format != KSDATAFORMAT_SUBTYPE_PCM:
+                        raise WaveError("unknown extended format")
+            elif chunk_id == b"data":
+                if fmt is None:
+                    raise WaveError("data chunk before fmt chunk")
+                break
+            # Chunks are word-aligned
+            offset += chunk_size + (chunk_size & 1)
+        else:
+            raise WaveError("fmt chunk and/or data chunk missing")
+        format_tag, n_channels, sample_rate, _, _, bits_per_sample = fmt
+        if format_tag not in (WAVE_FORMAT_PCM, WAVE_FORMAT_EXTENSIBLE):
+            raise WaveError(f"unknown format: {format_tag!r}")
+        if not n_channels:
+            raise WaveError("bad # of channels")
+        sample_width = (bits_per_sample + 7) // 8
+        if not sample_width:
+            raise WaveError("bad sample width")
+        # Kept apart from self._info so that slicing needs no tuple field lookups
+        self._sample_rate = sample_rate
+        self._frame_bytes = sample_width * n_channels
+        n_samples = chunk_size // self._frame_bytes
         self._info = WaveInfo(
-            n_channels=self._fp.getnchannels(),
-            sample_width=self._fp.getsampwidth(),
-            sample_rate=self._fp.getframerate(),
-            n_samples=self._fp.getnframes(),
-            compression_type=self._fp.getcomptype(),
-            compression_name=self._fp.getcompname()
+            n_channels=n_channels,
+            sample_width=sample_width,
+            sample_rate=sample_rate,
+            n_samples=n_samples,
         )
+        self._view = self._view[offset:offset + n_samples * self._frame_bytes]
 
     def get_filename(self):
         """Returns the filename of the wave file."""
-        return copy(self._filename)
+        return self._filename
 
     def get_info(self) -> WaveInfo:
         """Returns a dictionary with file information."""
-        return copy(self._info)
+        return self._info
+
+    def get_slice(self, start_seconds: float, end_seconds: float) -> memoryview:
+        """Return bytes between two points, specified in seconds (float).
 
-    def get_slice(self, start_seconds: float, end_seconds: float) -> bytes:
-        """Return bytes between two points, specified in seconds (float)."""
+        The returned memoryview points directly into the memory-mapped file and
+        is only valid until the reader is closed.
+        """
         if start_seconds >= end_seconds:
             raise ValueError("Start time must be before end time.")
-        start_sample = int(start_seconds * self._info.sample_rate)
-        end_sample = int(end_seconds * self._info.sample_rate)
-        self._fp.rewind()
-        self._fp.readframes(start_sample - 1) # use to advance to correct frame, discard data
-        return self._fp.readframes(end_sample - start_sample)
+        return self.get_frames(
+            int(start_seconds * self._sample_rate), int(end_seconds * self._sample_rate)
+        )
 
-    def close(self):
-        self._fp.close()
+    def get_frames(self, start_sample: int, end_sample: int) -> memoryview:
+        """Return bytes between two frame indices, like get_slice().
+
+        A span of zero frames, e.g. for a section shorter than one frame, is empty.
+        """
+        if start_sample > end_sample:
+            raise ValueError("Start frame must not be after end frame.")
+        return self._view[start_sample * self._frame_bytes:end_sample * self._frame_bytes]
 
-    def __del__(self):
+    def close(self):
+        self._view.release()
+        try:
+            self._mm.close()
+        except BufferError:
+            # Slices handed out by get_slice() are still alive, the mapping
+            # is released once they are garbage collected.
+            pass
+
+    def __enter__(self) -> "WaveReader":
+        return self
+
+    def __exit__(self, *exc_info):
         self.close()
 
 
 class WaveWriter:
 
     _filename: Path
-    _fp: Wave_write
+    _fd: int
     _info: WaveInfo
+    _frame_bytes: int
+    _data_written: int
+    _header_length: int | None
+    _pending: list[memoryview]
+    _pending_len: int
 
     def __init__(self, filename: StrPath, settings: WaveInfo):
+        if settings.compression_type != "NONE":
+            raise WaveError("unsupported compression type")
         self._filename = Path(filename)
-        self._fp: Wave_write = wave_open(str(filename), "wb")
-        self._fp.setnchannels(settings.n_channels)
-        self._fp.setsampwidth(settings.sample_width)
-        self._fp.setframerate(settings.sample_rate)
-        self._fp.setcomptype(settings.compression_type, settings.compression_name)
-    
+        self._fd = os.open(filename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | _O_BINARY, 0o666)
+        self._info = settings
+        self._frame_bytes = settings.sample_width * settings.n_channels
+        self._data_written = 0
+        self._header_length = None
+        self._pending = []
+        self._pending_len = 0
+
     @property
     def info(self):
-        return WaveInfo(
-            n_channels=self._fp.getnchannels(),
-            sample_width=self._fp.getsampwidth(),
-            sample_rate=self._fp.getframerate(),
-            n_samples=self._fp.getnframes(),
-            compression_type=self._fp.getcomptype(),
-            compression_name=self._fp.getcompname()
-        )
+        return self._info._replace(n_samples=self._data_written // self._frame_bytes)
 
     def get_filename(self):
         """Returns the filename of the wave file."""
-        return copy(self._filename)
+        return self._filename
 
     def get_info(self) -> WaveInfo:
         """Returns a dictionary with file information.
@@ -174,17 +287,80 @@ class WaveWriter:
             - compression_name: A human-readable version of the compression_type,
                 e.g. 'not compressed'.
         """
-        return copy(self._info)
+        return self._info
+
+    def _pack_header(self, data_length: int) -> bytes:
+        return _WAVE_HEADER.pack(
+            b"RIFF", 36 + data_length + (data_length & 1), b"WAVE",
+            b"fmt ", _FMT_CHUNK.size, WAVE_FORMAT_PCM, self._info.n_channels,
+            self._info.sample_rate, self._info.sample_rate * self._frame_bytes,
+            self._frame_bytes, self._info.sample_width * 8,
+            b"data", data_length
+        )
 
-    def set_samples(self, data: bytes):
-        self._fp.writeframes(data)
+    def append(self, data: bytes | memoryview):
+        """Queue frames to be written out on flush().
 
-    def close(self):
-        self._fp.close()
+        The data is referenced rather than copied, so it must not be modified
+        before the next flush() or close().
+        """
+        view = memoryview(data)
+        if view.nbytes:
+            self._pending.append(view)
+            self._pending_len += view.nbytes
+
+    def flush(self):
+        """Write all queued frames to the file in one go."""
+        if not self._pending_len:
+            return
+        if self._header_length is None:
+            # Send the header with the right length in the same call as the first frames
+            self._header_length = self._pending_len
+            _write_all(self._fd, [self._pack_header(self._header_length), *self._pending])
+        else:
+            _write_all(self._fd, self._pending)
+        self._data_written += self._pending_len
+        for view in self._pending:
+            view.release()
+        self._pending = []
+        self._pending_len = 0
 
-    def __del__(self):
+    def close(self):
+        if self._fd < 0:
+            return
+        try:
+            self.flush()
+            if self._header_length is None:
+                _write_all(self._fd, [self._pack_header(0)])
+            elif self._header_length != self._data_written:
+                # Frames were flushed more than once, so patch the lengths in the header
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                _write_all(self._fd, [self._pack_header(self._data_written)])
+                os.lseek(self._fd, 0, os.SEEK_END)
+            if self._data_written & 1:
+                # Chunks are word-aligned
+                _write_all(self._fd, [b"\x00"])
+        finally:
+            os.close(self._fd)
+            self._fd = -1
+
+    def __enter__(self) -> "WaveWriter":
+        return self
+
+    def __exit__(self, *exc_info):
         self.close()
 
 
+def _write_all(fd: int, buffers: list[bytes | memoryview]):
+    """Write all buffers to fd, gathering them into a single writev() where available."""
+    views = [memoryview(buffer).cast("B") for buffer in buffers]
+    while views:
+        written = _writev(fd, views[:_IOV_MAX]) if _writev else os.write(fd, views[0])
+        while views and written >= len(views[0]):
+            written -= len(views.pop(0))
+        if written:
+            views[0] = views[0][written:]
+
+
 if __name__ == "__main__":
     print("To directly invoke ProChopPy, run python -m prochoppy [options].")
\ No newline at end of file
@@ -1,32 +1,38 @@
 """Command-line interface for ProChopPy."""
 from argparse import ArgumentParser, RawDescriptionHelpFormatter
+from concurrent.futures import ProcessPoolExecutor
+from os import cpu_count
+from os.path import normcase
 from pathlib import Path
 from typing import Literal
-from . import AnnotationReader, WaveReader, WaveWriter, cliutil as cli
+from unicodedata import normalize
+from . import AnnotationReader, WaveReader, cliutil as cli
+from ._export import init_worker, export_sections
 
-__all__ = ["parse_args", "main"]
+__all__ = ["parse_args", "main", "run"]
 
 StrPath = str | Path
 
+_DESCRIPTION = cli.convert(
+    "<s bright><f green>ProChopPy</f> - Segment audio recordings into separate files based "
+    "on ProRec annotations.</s><br>"
+    "<br>"
+    "ProChopPy is a Python replacement for Mark Huckvale's ProChop (part of ProRec), which "
+    "chops up a recording into separate files, based on an annotation file containing the "
+    "break points. ProChopPy is designed to work with files recorded using ProRec, the prompt "
+    "&amp; record program by Mark Huckvale (https://www.phon.ucl.ac.uk/resource/prorec)."
+)
+_EPILOG = cli.convert(
+    "Note: <s dim>As compared to the original ProChop, ProChopPy does not implement export to the "
+    "proprietary format of the Speech Filing System (SFS).<br>\n"
+    "ProChopPy also does not currently support silence detection, which ProChop supports with "
+    "the -s option.</s>"
+)
+
 def parse_args() -> dict[str, str | bool]:
-    _description = cli.convert(
-        "<s bright><f green>ProChopPy</f> - Segment audio recordings into separate files based "
-        "on ProRec annotations.</s><br>"
-        "<br>"
-        "ProChopPy is a Python replacement for Mark Huckvale's ProChop (part of ProRec), which "
-        "chops up a recording into separate files, based on an annotation file containing the "
-        "break points. ProChopPy is designed to work with files recorded using ProRec, the prompt "
-        "&amp; record program by Mark Huckvale (https://www.phon.ucl.ac.uk/resource/prorec)."
-    )
-    _epilog = cli.convert(
-        "Note: <s dim>As compared to the original ProChop, ProChopPy does not implement export to the "
-        "proprietary format of the Speech Filing System (SFS).<br>\n"
-        "ProChopPy also does not currently support silence detection, which ProChop supports with "
-        "the -s option.</s>"
-    )
     parser = ArgumentParser(
-        description=_description,
-        epilog=_epilog,
+        description=_DESCRIPTION,
+        epilog=_EPILOG,
         formatter_class=RawDescriptionHelpFormatter
     )
     parser.add_argument("-I", action="version", version="0.1.1", help="Report version number and exit.")
@@ -52,7 +58,8 @@ def main(
     output_dir: StrPath,
     file_type: Literal["wav", "sfs"] = "wav",
     keep_duplicates: bool = False,
-    remove_silence: bool = False
+    remove_silence: bool = False,
+    max_workers: int | None = None
     ):
         # Check arguments
         audio_file = Path(audio_file)
@@ -72,35 +79,72 @@ def main(
         cli.writeln("<s bright><f yellow>Chopping audio file with ProChopPy...</f></s>")
         annotations = AnnotationReader(annotation_file)
         cli.writeln(f"<s dim>Annotation file:   <f green>{annotations.get_filename()}</f></s>")
-        cli.writeln(f"<s dim>  - Sections:      <f cyan>{len(annotations)}</f></s>")
-        audio_in = WaveReader(audio_file)
-        audio_in_info = audio_in.get_info()
+        # Later sections overwrite earlier ones with the same label, so only export those
+        # (re-inserting keeps the sections in file order)
+        sections: dict[Path, tuple[float, float, str]] = {}
+        for start, end, label in annotations:
+            # Checked for every section, including those a later duplicate replaces
+            if start >= end:
+                raise ValueError("Start time must be before end time.")
+            output_file = output_dir / f"{label}.wav"
+            sections.pop(output_file, None)
+            sections[output_file] = (start, end, label)
+        if len(sections) < len(annotations):
+            cli.writeln(
+                f"<s dim>  - Sections:      <f cyan>{len(sections)}</f> "
+                f"({len(annotations) - len(sections)} with duplicate labels skipped)</s>"
+            )
+        else:
+            cli.writeln(f"<s dim>  - Sections:      <f cyan>{len(sections)}</f></s>")
+        with WaveReader(audio_file) as audio_in:
+            audio_in_info = audio_in.get_info()
         cli.writeln(f"<s dim>Source audio file: <f green>{audio_in.get_filename()}</f></s>")
         cli.writeln(f"<s dim>  - Channels:      <f cyan>{audio_in_info.n_channels}</f></s>")
         cli.writeln(f"<s dim>  - Sample rate:   <f cyan>{audio_in_info.sample_rate}Hz</f></s>")
         cli.writeln(f"<s dim>  - Length:        <f cyan>{audio_in_info.length}s</f></s>")
         cli.writeln(f"<s dim>Output directory:  <f green>{output_dir}</f></s>")
+        # Resolve the times to frame spans up front, so workers only slice and write.
+        # Names that may still be the same file on a case- or normalisation-insensitive
+        # filesystem go into one task, so they are overwritten in order like before.
+        groups: dict[str, list[tuple[float, float, str]]] = {}
+        tasks: dict[str, list[tuple[int, int, Path]]] = {}
+        for output_file, (start, end, label) in sections.items():
+            key = normalize("NFC", normcase(str(output_file)).casefold())
+            groups.setdefault(key, []).append((start, end, label))
+            tasks.setdefault(key, []).append((
+                int(start * audio_in_info.sample_rate),
+                int(end * audio_in_info.sample_rate),
+                output_file
+            ))
         counter: int = 1
-        max: int = len(annotations)
-        counter_width: int = len(str(max))
+        total: int = len(sections)
+        counter_width: int = len(str(total))
         label_width: int = annotations.get_max_marker_len()
-        for start, end, label in annotations:
-            if counter > 1:
-                cli.clearln()
-            cli.write(f"<s bright>Processing files:</s>  ")
-            cli.write(f"<s dim><f cyan>{str(counter).rjust(counter_width)}/{max}</f></s> ")
-            cli.write(f"<f green>{label.ljust(label_width)} </f><s dim><f cyan>({start}s to {end}s)</f></s>")
-            output_file = output_dir / f"{label}.wav"
-            audio_out = WaveWriter(output_file, audio_in_info)
-            slice_data = audio_in.get_slice(start, end)
-            audio_out.set_samples(slice_data)
-            audio_out.close()
-            counter += 1
+        # Convert the markup once, only the fields are filled in per section
+        progress_line = cli.convert(
+            "<s bright>Processing files:</s>  "
+            f"<s dim><f cyan>{{counter:>{counter_width}}}/{total}</f></s> "
+            f"<f green>{{label:<{label_width}}} </f><s dim><f cyan>({{start}}s to {{end}}s)</f></s>"
+        )
+        chunksize = max(1, len(tasks) // (4 * (max_workers or cpu_count() or 1)))
+        with ProcessPoolExecutor(max_workers, initializer=init_worker, initargs=(audio_file,)) as executor:
+            results = executor.map(export_sections, tasks.values(), chunksize=chunksize)
+            for group, _ in zip(groups.values(), results):
+                for start, end, label in group:
+                    if counter > 1:
+                        cli.clearln()
+                    cli.write_raw(progress_line.format(counter=counter, label=label, start=start, end=end))
+                    counter += 1
         cli.newln()
         cli.writeln(f"<s bright><f yellow>Chopping completed.</f></s>")
 
 
-if __name__ == "__main__":
+def run():
+    """Entry point for the prochoppy console script and python -m prochoppy."""
     cli.init()
     arguments = parse_args()
-    main(**arguments)  # type: ignore
\ No newline at end of file
+    main(**arguments)  # type: ignore
+
+
+if __name__ == "__main__":
+    run()
\ No newline at end of file
@@ -0,0 +1,30 @@
+"""Worker process functions for exporting sections in parallel.
+
+These live in their own importable module rather than in __main__, since worker
+processes started with spawn or forkserver cannot unpickle functions defined in
+a package's __main__ module.
+"""
+from pathlib import Path
+from . import WaveReader, WaveWriter
+
+__all__ = ["init_worker", "export_sections"]
+
+# The audio file opened by each worker process, see init_worker()
+_audio_in: WaveReader
+
+
+def init_worker(audio_file: Path):
+    """Open the source audio file once per worker process."""
+    global _audio_in
+    _audio_in = WaveReader(audio_file)
+
+
+def export_sections(task: list[tuple[int, int, Path]]):
+    """Write each (start_frame, end_frame, output_file) span of the source audio file in turn.
+
+    Spans whose output files may refer to the same file on disk are passed in one task,
+    so they are written one after another in annotation order.
+    """
+    for start_sample, end_sample, output_file in task:
+        with WaveWriter(output_file, _audio_in.get_info()) as audio_out:
+            audio_out.append(_audio_in.get_frames(start_sample, end_sample))
@@ -19,145 +19,88 @@ the previous state.
 Like HTML, whitespace is collapsed to a single occurence and newlines are ignored
 (use <br /> or <br> to effect a newline).
 """
+import re
+import sys
+from functools import lru_cache
 from colorama import Fore, Back, Style, init as init_colorama
-from html import escape as html_escape
-from html.parser import HTMLParser
-
-__all__ = ["init", "convert", "writeln", "newln", "write", "clearln", "ColoramaMLParser"]
-
-class ColoramaMLParser(HTMLParser):
-    """An SGML parser for HTML-like markup of colorama strings.
-    """
-
-    # Class attributes
-    fores = {
-        'black':    Fore.BLACK,
-        'red':      Fore.RED,
-        'green':    Fore.GREEN,
-        'yellow':   Fore.YELLOW,
-        'blue':     Fore.BLUE,
-        'magenta':  Fore.MAGENTA,
-        'cyan':     Fore.CYAN,
-        'white':    Fore.WHITE,
-        'reset':    Fore.RESET
-    }
-    backs = {
-        'black':    Back.BLACK,
-        'red':      Back.RED,
-        'green':    Back.GREEN,
-        'yellow':   Back.YELLOW,
-        'blue':     Back.BLUE,
-        'magenta':  Back.MAGENTA,
-        'cyan':     Back.CYAN,
-        'white':    Back.WHITE,
-        'reset':    Back.RESET
-    }
-    styles = {
-        'dim':      Style.DIM,
-        'normal':   Style.NORMAL,
-        'bright':   Style.BRIGHT,
-        'reset':    Style.RESET_ALL
-    }
-
-    # Instance attributes
-    _current_fore: str
-    _current_back: str
-    _current_style: str
-    _fore_queue: list[str]
-    _back_queue: list[str]
-    _style_queue: list[str]
-    _output_buffer: list[str]
-
-    def __init__(self, *, convert_charrefs: bool = ...) -> None:
-        super().__init__(convert_charrefs=convert_charrefs)
-        self.clear_buffer()
-
-    def get_buffer(self) -> str:
-        return "".join(self._output_buffer)
-
-    def clear_buffer(self):
-        self._current_fore: str = self.fores["reset"]
-        self._current_back: str = self.backs["reset"]
-        self._current_style: str = self.styles["reset"]
-        self._output_buffer = []
-        self._fore_queue = []
-        self._back_queue = []
-        self._style_queue = []
-
-    def handle_starttag(self, tag: str, attrs: list[tuple[str, str | None]]) -> None:
-        if tag == "br":
-            self._output_buffer.append("\n")
-        elif tag == "b":
-            for k, v in attrs:
-                if k in self.backs:
-                    self._back_queue.append(self._current_back)
-                    self._current_back = self.backs[k]
-                    self._output_buffer.append(self._current_back)
-        elif tag == "f":
-            for k, v in attrs:
-                if k in self.fores:
-                    self._fore_queue.append(self._current_fore)
-                    self._current_fore = self.fores[k]
-                    self._output_buffer.append(self._current_fore)
-        elif tag == "s":
-            for k, v in attrs:
-                if k in self.styles:
-                    self._style_queue.append(self._current_style)
-                    self._current_style = self.styles[k]
-                    self._output_buffer.append(self._current_style)
-        else:
-            attrlist: list[str] = []
-            for k, v in attrs:
-                if v is None:
-                    attrlist.append(k)
-                else:
-                    attrlist.append(f'{k}="{html_escape(v)}"')
-            attrstr = " ".join(attrlist)
-            if attrstr:
-                self._output_buffer.append(f"<{tag} {attrstr}>")
-            else:
-                self._output_buffer.append(f"<{tag}>")
-
-    def handle_data(self, data: str) -> None:
-        # if len(data.lstrip()) < len(data):
-        #     self._output_buffer.append(" ")
-        # self._output_buffer.append(data.strip())
-        # if len(data.rstrip()) < len(data):
-        #     self._output_buffer.append(" ")
-        self._output_buffer.append(data.strip("\r\n"))
-
-    def handle_endtag(self, tag: str) -> None:
-        if tag == "br":
-            pass
-        elif tag == "b":
-            back = self._back_queue.pop() if len(self._back_queue) else self.backs["reset"]
-            self._current_back = back
-            self._output_buffer.append(back)
-        elif tag == "f":
-            fore = self._fore_queue.pop() if len(self._fore_queue) else self.fores["reset"]
-            self._current_fore = fore
-            self._output_buffer.append(fore)
-        elif tag == "s":
-            style = self._style_queue.pop() if len(self._style_queue) else self.styles["reset"]
-            self._current_style = style
-            self._output_buffer.append(style)
-            self._output_buffer.append(self._current_back)
-            self._output_buffer.append(self._current_fore)
-        else:
-            self._output_buffer.append(f"</{tag}>")
+from html import unescape as html_unescape
+
+__all__ = ["init", "convert", "writeln", "newln", "write", "write_raw", "clearln"]
+
+_FORES = {
+    'black':    Fore.BLACK,
+    'red':      Fore.RED,
+    'green':    Fore.GREEN,
+    'yellow':   Fore.YELLOW,
+    'blue':     Fore.BLUE,
+    'magenta':  Fore.MAGENTA,
+    'cyan':     Fore.CYAN,
+    'white':    Fore.WHITE,
+    'reset':    Fore.RESET
+}
+_BACKS = {
+    'black':    Back.BLACK,
+    'red':      Back.RED,
+    'green':    Back.GREEN,
+    'yellow':   Back.YELLOW,
+    'blue':     Back.BLUE,
+    'magenta':  Back.MAGENTA,
+    'cyan':     Back.CYAN,
+    'white':    Back.WHITE,
+    'reset':    Back.RESET
+}
+_STYLES = {
+    'dim':      Style.DIM,
+    'normal':   Style.NORMAL,
+    'bright':   Style.BRIGHT,
+    'reset':    Style.RESET_ALL
+}
+_CODES = {"b": _BACKS, "f": _FORES, "s": _STYLES}
+
+# Matches the opening and closing tags of the markup, e.g. "<f cyan>", "</f>" or "<br />".
+# Anything else (including unknown tags) is passed through as data.
+_TAG_RE = re.compile(r"<(/?)(br|[bfs])(?=[\s/>])([^<>]*)>", re.IGNORECASE)
+
 
 def init():
     """Initialise the cli util (will call colorama.init())."""
     init_colorama()
 
 
+@lru_cache(maxsize=256)
 def convert(x: str) -> str:
     """Convert a string with xml-ified colorama markup to colorama string."""
     if "<" not in x or ">" not in x:
         return x
-    parser = ColoramaMLParser()
-    parser.feed(x)
-    return parser.get_buffer()
+    current = {tag: codes["reset"] for tag, codes in _CODES.items()}
+    previous: dict[str, list[str]] = {tag: [] for tag in _CODES}
+    output: list[str] = []
+    pos = 0
+    for match in _TAG_RE.finditer(x):
+        output.append(html_unescape(x[pos:match.start()]).strip("\r\n"))
+        pos = match.end()
+        closing, tag, attrs = match.groups()
+        tag = tag.lower()
+        if tag == "br":
+            if not closing:
+                output.append("\n")
+        elif closing:
+            code = previous[tag].pop() if previous[tag] else _CODES[tag]["reset"]
+            current[tag] = code
+            output.append(code)
+            if tag == "s":
+                # Style.RESET_ALL also resets the colours, so restore them
+                output.append(current["b"])
+                output.append(current["f"])
+        else:
+            codes = _CODES[tag]
+            for attr in attrs.lower().replace("/", " ").split():
+                if attr in codes:
+                    previous[tag].append(current[tag])
+                    current[tag] = codes[attr]
+                    output.append(current[tag])
+    output.append(html_unescape(x[pos:]).strip("\r\n"))
+    return "".join(output)
 
 
 def writeln(*args: str, sep: str =" ", convert_: bool = True):
@@ -179,6 +122,11 @@ def write(*args: str, sep: str = " ", convert_: bool = True):
         print(sep.join(args), sep="", end="")
 
 
+def write_raw(x: str):
+    """Write an already converted string to output, without going through print()."""
+    sys.stdout.write(x)
+
+
 def clearln():
     """Erase current line and go back to its start."""
     print("\033[2K\r", sep="", end="", flush=True)